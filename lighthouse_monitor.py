@@ -6,33 +6,88 @@ Uses Google PageSpeed Insights API to run Lighthouse audits and
 sends email alerts when scores change significantly.
 """
 
+import asyncio
+import functools
+import hashlib
 import json
 import os
+import random
 import smtplib
 import sys
-from datetime import datetime
+from collections import deque
+from datetime import datetime, timezone
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Mapping, Optional
 from urllib.parse import urlencode
 
-import requests
+import httpx
+import ijson
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib json module
+    orjson = None
+
+try:
+    import xxhash
+except ImportError:  # Fall back to hashlib
+    xxhash = None
 
 # Configuration defaults
 DEFAULT_THRESHOLD = 5  # Alert if score changes by this many points
 PAGESPEED_API_URL = "https://www.googleapis.com/pagespeedonline/v5/runPagespeed"
+DEFAULT_MAX_CONCURRENCY = 8  # Keep in-flight audits well under the API's per-minute quota
+RETRY_ATTEMPTS = 3  # Total tries per audit, i.e. the first request plus 2 retries
+RETRY_BACKOFF = 2.0  # Seconds before the first retry, doubled on each retry (plus up to 1s of jitter)
+MAX_RETRY_AFTER = 120  # Cap on a 429's Retry-After wait, in seconds
+
+HISTORY_LIMIT = 52  # Keep 1 year of weekly runs
 
 CATEGORIES = ["performance", "accessibility", "best-practices", "seo"]
 
 
+@functools.lru_cache(maxsize=None)
+def category_label(category: str) -> str:
+    """Human-readable name for a category, e.g. "best-practices" -> "Best Practices"."""
+    return category.replace("-", " ").title()
+
+
+@functools.lru_cache(maxsize=None)
+def category_api_keys(category: str) -> tuple[str, ...]:
+    """Keys a category may appear under in the API response (sometimes without hyphens)."""
+    return tuple(dict.fromkeys((category, category.replace("-", ""))))
+
+
+def loads_json(data: bytes):
+    """Parse JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_json(obj, indent: bool = True) -> bytes:
+    """Serialize obj as JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None)
+    if indent:
+        return json.dumps(obj, indent=2).encode()
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+@functools.lru_cache(maxsize=1)
 def load_config() -> dict:
-    """Load configuration from config.json or environment variables."""
+    """Load configuration from config.json or environment variables.
+    
+    The result is cached, so config.json and the environment are only read
+    once; call load_config.cache_clear() to pick up changes.
+    """
     config_path = Path(__file__).parent / "config.json"
     
     if config_path.exists():
-        with open(config_path) as f:
-            config = json.load(f)
+        config = loads_json(config_path.read_bytes())
     else:
         config = {}
     
@@ -53,99 +108,353 @@ def load_config() -> dict:
         "email_from": env_or("EMAIL_FROM", config.get("email_from", "")),
         "email_to": env_or("EMAIL_TO", config.get("email_to", "")),
         "categories": config.get("categories", CATEGORIES),
+        # At least one audit must be allowed in flight, or the run would never finish
+        "max_concurrency": max(1, int(env_or("MAX_CONCURRENCY", config.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)))),
     }
 
 
-def load_history() -> dict:
-    """Load previous results from history file."""
-    history_path = Path(__file__).parent / "history.json"
+def write_atomic(path: Path, data: bytes) -> None:
+    """Write data to path via a temp file and os.replace, so a crash never leaves it truncated."""
+    tmp_path = path.with_name(path.name + ".tmp")
     
-    if history_path.exists():
-        with open(history_path) as f:
-            return json.load(f)
-    return {"runs": []}
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
 
 
-def save_history(history: dict) -> None:
-    """Save results to history file."""
-    history_path = Path(__file__).parent / "history.json"
+def normalize_run(run: dict) -> dict:
+    """Convert a run's results from the legacy [{url, scores}] list to a {url: scores} dict."""
+    if isinstance(run.get("results"), list):
+        run["results"] = {result["url"]: result["scores"] for result in run["results"]}
+    return run
+
+
+def migrate_history() -> None:
+    """Convert a legacy history.json array into the history.jsonl format."""
+    legacy_path = Path(__file__).parent / "history.json"
+    history_path = Path(__file__).parent / "history.jsonl"
+    
+    if not legacy_path.exists() or history_path.exists():
+        return
     
-    with open(history_path, "w") as f:
-        json.dump(history, f, indent=2)
+    runs = loads_json(legacy_path.read_bytes()).get("runs", [])[-HISTORY_LIMIT:]
+    for number, run in enumerate(runs, 1):
+        run["run"] = number
+    write_atomic(
+        history_path,
+        b"".join(dumps_json(normalize_run(run), indent=False) + b"\n" for run in runs),
+    )
+    legacy_path.unlink()
+    print("Migrated history.json to history.jsonl")
 
 
-def run_lighthouse(url: str, api_key: str, categories: list[str]) -> Optional[dict]:
-    """Run Lighthouse audit via PageSpeed Insights API."""
-    params = {
-        "url": url,
-        "strategy": "mobile",  # or "desktop"
-    }
+def load_last_run() -> Optional[dict]:
+    """Load the most recent run from the history file.
     
-    for category in categories:
-        params["category"] = params.get("category", [])
-        if isinstance(params["category"], str):
-            params["category"] = [params["category"]]
+    Only the tail of the file is read, one block at a time from the end,
+    until it contains a complete line. A partial last line left by an
+    interrupted append is ignored.
+    """
+    history_path = Path(__file__).parent / "history.jsonl"
     
-    # Build URL with multiple category params
-    query_parts = [f"url={requests.utils.quote(url)}", "strategy=mobile"]
-    for cat in categories:
-        query_parts.append(f"category={cat}")
-    if api_key:
-        query_parts.append(f"key={api_key}")
+    if not history_path.exists():
+        return None
     
-    full_url = f"{PAGESPEED_API_URL}?{'&'.join(query_parts)}"
+    with open(history_path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        tail = b""
+        while pos > 0 and tail.count(b"\n") < 2:
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+    
+    lines = tail.split(b"\n")
+    if pos > 0:
+        lines = lines[1:]  # First line may be cut off mid-record
+    # Anything after the final newline is a partial record (or empty)
+    for line in reversed(lines[:-1]):
+        if line.strip():
+            try:
+                return normalize_run(loads_json(line))
+            except ValueError:
+                continue  # Partial record from an interrupted append
+    return None
+
+
+def save_history(run: dict) -> None:
+    """Append a run to the history file.
+    
+    Each run is numbered one past the previous run, so the first and last
+    lines give the run count without reading the rest of the file. A normal
+    save is a single append; the file is only trimmed back to the last
+    HISTORY_LIMIT runs once it holds twice that many.
+    """
+    history_path = Path(__file__).parent / "history.jsonl"
+    
+    last_run = load_last_run()
+    run = {**run, "run": (last_run or {}).get("run", 0) + 1}
+    line = dumps_json(run, indent=False) + b"\n"
+    
+    with open(history_path, "ab+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                line = b"\n" + line  # Don't join onto a partial line left by an interrupted append
+        f.write(line)
+        f.seek(0)
+        first_line = f.readline()
     
     try:
-        print(f"Running Lighthouse for: {url}")
-        response = requests.get(full_url, timeout=120)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Extract scores
-        lighthouse_result = data.get("lighthouseResult", {})
-        categories_data = lighthouse_result.get("categories", {})
-        
-        scores = {}
-        for cat in categories:
-            cat_key = cat.replace("-", "")  # API returns without hyphens sometimes
-            if cat in categories_data:
-                scores[cat] = int(categories_data[cat]["score"] * 100)
-            elif cat.replace("-", "") in categories_data:
-                scores[cat] = int(categories_data[cat.replace("-", "")]["score"] * 100)
-            # Handle 'best-practices' specifically
-            elif cat == "best-practices" and "best-practices" in categories_data:
-                scores[cat] = int(categories_data["best-practices"]["score"] * 100)
-        
-        return scores
-        
-    except requests.RequestException as e:
-        print(f"Error running Lighthouse for {url}: {e}")
+        first_number = loads_json(first_line).get("run")
+    except ValueError:
+        first_number = None  # Partial record; let the trim drop it
+    
+    # Unnumbered (legacy) runs are numbered by the trim
+    if first_number is None or run["run"] - first_number + 1 > 2 * HISTORY_LIMIT:
+        trim_history(history_path)
+
+
+def trim_history(history_path: Path) -> None:
+    """Rewrite the history file keeping only the last HISTORY_LIMIT complete runs."""
+    # Stream the file through a bounded deque so only the runs being kept are held
+    runs = deque(maxlen=HISTORY_LIMIT)
+    with open(history_path, "rb") as f:
+        for line in f:
+            try:
+                runs.append(loads_json(line))
+            except ValueError:
+                continue  # Partial record from an interrupted append
+    
+    # Renumber from 1 so the numbers keep counting the runs in the file
+    for number, run in enumerate(runs, 1):
+        run["run"] = number
+    
+    write_atomic(history_path, b"".join(dumps_json(run, indent=False) + b"\n" for run in runs))
+
+
+def load_response_cache() -> dict:
+    """Load cached ETags and scores from the response cache file."""
+    cache_path = Path(__file__).parent / "response_cache.json"
+    
+    if cache_path.exists():
+        return loads_json(cache_path.read_bytes())
+    return {}
+
+
+def save_response_cache(cache: dict) -> None:
+    """Save cached ETags and scores to the response cache file."""
+    cache_path = Path(__file__).parent / "response_cache.json"
+    
+    write_atomic(cache_path, dumps_json(cache))
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits (429), server errors (5xx) and network failures are worth retrying."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait as requested by a 429 response's Retry-After header, if any."""
+    if not isinstance(error, httpx.HTTPStatusError) or error.response.status_code != 429:
         return None
+    
+    value = error.response.headers.get("Retry-After", "").strip()
+    if value.isdigit():
+        seconds = float(value)
+    else:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)  # "-0000" dates parse as naive UTC
+        seconds = max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    return min(seconds, MAX_RETRY_AFTER)
+
+
+def all_categories_seen(categories_data: dict, categories: list[str]) -> bool:
+    """Whether every category has been seen under at least one of its API keys.
+    
+    The key variants (e.g. "best-practices" and "bestpractices") are
+    alternatives, so only one per category is ever expected.
+    """
+    return all(
+        any(key in categories_data for key in category_api_keys(cat))
+        for cat in categories
+    )
+
+
+async def fetch_categories(
+    client: httpx.AsyncClient,
+    full_url: str,
+    categories: list[str],
+    etag: Optional[str] = None,
+) -> tuple[Optional[dict], Mapping[str, str]]:
+    """Stream lighthouseResult.categories from the API, retrying transient failures.
+    
+    The body is fed to ijson chunk by chunk and reading stops as soon as every
+    category has been seen, so audits, screenshots and traces are never loaded.
+    When etag is given it is sent as If-None-Match; a 304 response is returned
+    as (None, headers) so the caller can fall back to its cached copy.
+    """
+    headers = {"If-None-Match": etag} if etag else {}
+    wanted = {key for cat in categories for key in category_api_keys(cat)}
+    
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            async with client.stream("GET", full_url, headers=headers) as response:
+                if response.status_code == 304:
+                    return None, response.headers
+                response.raise_for_status()
+                
+                categories_data = {}
+                events = ijson.sendable_list()
+                parser = ijson.kvitems_coro(events, "lighthouseResult.categories", use_float=True)
+                async for chunk in response.aiter_bytes():
+                    parser.send(chunk)
+                    categories_data.update((key, value) for key, value in events if key in wanted)
+                    del events[:]
+                    if all_categories_seen(categories_data, categories):
+                        break
+                else:
+                    parser.close()  # Raises if the body was truncated
+                return categories_data, response.headers
+        except httpx.HTTPError as e:
+            if attempt == RETRY_ATTEMPTS - 1 or not is_retryable(e):
+                raise
+            delay = retry_after(e)
+            if delay is None:
+                delay = RETRY_BACKOFF * 2 ** attempt + random.random()
+            print(f"  Retrying in {delay:.1f}s after error: {str(e) or type(e).__name__}")
+            await asyncio.sleep(delay)
+
+
+async def run_lighthouse_async(
+    client: httpx.AsyncClient,
+    sem: asyncio.Semaphore,
+    url: str,
+    api_key: str,
+    categories: list[str],
+    cache: dict,
+) -> Optional[dict]:
+    """Run Lighthouse audit via PageSpeed Insights API.
+    
+    Scores are served from the response cache when the API answers 304 Not Modified.
+    """
+    # Build URL with multiple category params
+    params = [
+        ("url", url),
+        ("strategy", "mobile"),  # or "desktop"
+        *[("category", cat) for cat in categories],
+        # Partial response: only the category scores are sent back, not the full report
+        ("fields", "lighthouseResult/categories/*/score"),
+    ]
+    if api_key:
+        params.append(("key", api_key))
+    
+    full_url = f"{PAGESPEED_API_URL}?{urlencode(params, doseq=True)}"
+    
+    cached = cache.get(url, {})
+    
+    async with sem:
+        try:
+            print(f"Running Lighthouse for: {url}")
+            categories_data, headers = await fetch_categories(
+                client, full_url, categories, cached.get("etag")
+            )
+        except (httpx.HTTPError, ijson.JSONError) as e:
+            print(f"Error running Lighthouse for {url}: {str(e) or type(e).__name__}")
+            return None
+    
+    if categories_data is None:
+        print(f"  Not modified, using cached scores for: {url}")
+        return cached["scores"]
+    
+    # Extract scores
+    scores = {}
+    for cat in categories:
+        for key in category_api_keys(cat):
+            if key in categories_data:
+                scores[cat] = int(categories_data[key]["score"] * 100)
+                break
+    
+    if headers.get("ETag"):
+        cache[url] = {
+            "etag": headers["ETag"],
+            "scores": scores,
+            "last_modified": headers.get("Last-Modified"),
+        }
+    
+    return scores
+
+
+async def run_all(urls: list[str], config: dict) -> list[Optional[dict]]:
+    """Run Lighthouse audits for all URLs concurrently, preserving input order."""
+    sem = asyncio.Semaphore(config["max_concurrency"])
+    cache = load_response_cache()
+    
+    # One HTTP/2 client for every audit: requests are multiplexed over a single
+    # pooled connection, so the TLS handshake is paid once per run
+    limits = httpx.Limits(
+        max_connections=config["max_concurrency"],
+        max_keepalive_connections=config["max_concurrency"],
+        keepalive_expiry=60,
+    )
+    
+    async with httpx.AsyncClient(http2=True, timeout=120, limits=limits) as client:
+        results = await asyncio.gather(
+            *[
+                run_lighthouse_async(client, sem, url, config["api_key"], config["categories"], cache)
+                for url in urls
+            ],
+            return_exceptions=True,
+        )
+    
+    save_response_cache(cache)
+    
+    scores = []
+    for url, result in zip(urls, results):
+        if isinstance(result, Exception):
+            print(f"Error running Lighthouse for {url}: {result}")
+            result = None
+        scores.append(result)
+    return scores
+
+
+def diff_scores(current: dict, previous: dict) -> dict[str, int]:
+    """Return the score change for every category present in both runs."""
+    return {
+        category: score - previous[category]
+        for category, score in current.items()
+        if previous.get(category) is not None
+    }
 
 
-def compare_scores(current: dict, previous: dict, threshold: int) -> list[dict]:
-    """Compare current scores to previous and return changes exceeding threshold."""
+def compare_scores(current: dict, previous: dict, diffs: dict[str, int], threshold: int) -> list[dict]:
+    """Return the changes from diff_scores whose size meets the threshold."""
     changes = []
     
-    for category, current_score in current.items():
-        prev_score = previous.get(category)
-        if prev_score is not None:
-            diff = current_score - prev_score
-            if abs(diff) >= threshold:
-                changes.append({
-                    "category": category,
-                    "previous": prev_score,
-                    "current": current_score,
-                    "diff": diff,
-                    "direction": "improved" if diff > 0 else "declined"
-                })
+    for category, diff in diffs.items():
+        if abs(diff) >= threshold:
+            changes.append({
+                "category": category,
+                "previous": previous[category],
+                "current": current[category],
+                "diff": diff,
+                "direction": "improved" if diff > 0 else "declined"
+            })
     
     return changes
 
 
-def format_email_html(results: list[dict], run_date: str) -> str:
-    """Format results as HTML email."""
-    html = f"""
+# Static parts of the HTML email; EMAIL_HTML_HEAD and EMAIL_HTML_ROW are str.format templates
+EMAIL_HTML_HEAD = """
     <html>
     <head>
         <style>
@@ -172,19 +481,7 @@ def format_email_html(results: list[dict], run_date: str) -> str:
             <h1>🔍 Lighthouse Report</h1>
             <p><strong>Run Date:</strong> {run_date}</p>
     """
-    
-    for result in results:
-        url = result["url"]
-        scores = result["scores"]
-        changes = result.get("changes", [])
-        previous = result.get("previous", {})
-        
-        html += f'<div class="url-section"><h2>{url}</h2>'
-        
-        if changes:
-            html += '<div class="alert">⚠️ Score changes detected!</div>'
-        
-        html += """
+EMAIL_HTML_TABLE_HEAD = """
             <table class="score-table">
                 <tr>
                     <th>Category</th>
@@ -193,107 +490,208 @@ def format_email_html(results: list[dict], run_date: str) -> str:
                     <th>Change</th>
                 </tr>
         """
-        
-        for category, score in scores.items():
-            prev_score = previous.get(category, "N/A")
-            
-            # Determine score badge color
-            if score >= 90:
-                badge_class = "score-good"
-            elif score >= 50:
-                badge_class = "score-ok"
-            else:
-                badge_class = "score-bad"
-            
-            # Determine change display
-            if prev_score != "N/A":
-                diff = score - prev_score
-                if diff > 0:
-                    change_html = f'<span class="improved">+{diff} ↑</span>'
-                elif diff < 0:
-                    change_html = f'<span class="declined">{diff} ↓</span>'
-                else:
-                    change_html = '<span class="no-change">—</span>'
-            else:
-                change_html = '<span class="no-change">First run</span>'
-            
-            html += f"""
+EMAIL_HTML_ROW = """
                 <tr>
-                    <td>{category.replace("-", " ").title()}</td>
+                    <td>{label}</td>
                     <td><span class="score-badge {badge_class}">{score}</span></td>
                     <td>{prev_score}</td>
                     <td>{change_html}</td>
                 </tr>
             """
-        
-        html += "</table></div>"
-    
-    html += """
+EMAIL_HTML_TAIL = """
         </div>
     </body>
     </html>
     """
-    
-    return html
 
+# Lookup tables indexed by score band (bad/ok/good) and by sign of the change (-1/0/+1) + 1
+SCORE_BADGES = ("score-bad", "score-ok", "score-good")
+CHANGE_HTML = (
+    '<span class="declined">{diff} ↓</span>',
+    '<span class="no-change">—</span>',
+    '<span class="improved">+{diff} ↑</span>',
+)
+CHANGE_TEXT = ("{diff} ↓", "—", "+{diff} ↑")
 
-def format_email_text(results: list[dict], run_date: str) -> str:
-    """Format results as plain text email."""
-    text = f"LIGHTHOUSE REPORT\n{'=' * 50}\nRun Date: {run_date}\n\n"
+
+def make_html_renderer(categories: list[str]) -> Callable[[list[dict], str], str]:
+    """Build format_email_html specialized for the configured categories.
+    
+    The category order and row labels are fixed once here rather than
+    re-derived from each URL's scores on every render.
+    """
+    labels = [(category, category_label(category)) for category in categories]
     
-    for result in results:
-        url = result["url"]
-        scores = result["scores"]
-        changes = result.get("changes", [])
-        previous = result.get("previous", {})
+    def format_email_html(results: list[dict], run_date: str) -> str:
+        """Format results as HTML email."""
+        html = [EMAIL_HTML_HEAD.format(run_date=run_date)]
+        
+        for result in results:
+            url = result["url"]
+            scores = result["scores"]
+            changes = result.get("changes", [])
+            previous = result.get("previous", {})
+            diffs = result.get("diffs", {})
+            
+            html.append(f'<div class="url-section"><h2>{url}</h2>')
+            
+            if changes:
+                html.append('<div class="alert">⚠️ Score changes detected!</div>')
+            
+            html.append(EMAIL_HTML_TABLE_HEAD)
+            
+            for category, label in labels:
+                score = scores.get(category)
+                if score is None:
+                    continue
+                prev_score = previous.get(category, "N/A")
+                
+                # Determine score badge color: 0-49 bad, 50-89 ok, 90+ good
+                badge_class = SCORE_BADGES[(score >= 50) + (score >= 90)]
+                
+                # Determine change display
+                diff = diffs.get(category)
+                if diff is not None:
+                    change_html = CHANGE_HTML[(diff > 0) - (diff < 0) + 1].format(diff=diff)
+                else:
+                    change_html = '<span class="no-change">First run</span>'
+                
+                html.append(EMAIL_HTML_ROW.format(
+                    label=label,
+                    badge_class=badge_class,
+                    score=score,
+                    prev_score=prev_score,
+                    change_html=change_html,
+                ))
+            
+            html.append("</table></div>")
         
-        text += f"\n{url}\n{'-' * len(url)}\n\n"
+        html.append(EMAIL_HTML_TAIL)
         
-        if changes:
-            text += "⚠️  SCORE CHANGES DETECTED!\n\n"
+        return "".join(html)
+    
+    return format_email_html
+
+
+def make_text_renderer(categories: list[str]) -> Callable[[list[dict], str], str]:
+    """Build format_email_text specialized for the configured categories."""
+    labels = [(category, category_label(category)) for category in categories]
+    
+    def format_email_text(results: list[dict], run_date: str) -> str:
+        """Format results as plain text email."""
+        text = [f"LIGHTHOUSE REPORT\n{'=' * 50}\nRun Date: {run_date}\n\n"]
         
-        for category, score in scores.items():
-            prev_score = previous.get(category, "N/A")
+        for result in results:
+            url = result["url"]
+            scores = result["scores"]
+            changes = result.get("changes", [])
+            previous = result.get("previous", {})
+            diffs = result.get("diffs", {})
             
-            if prev_score != "N/A":
-                diff = score - prev_score
-                if diff > 0:
-                    change = f"+{diff} ↑"
-                elif diff < 0:
-                    change = f"{diff} ↓"
+            text.append(f"\n{url}\n{'-' * len(url)}\n\n")
+            
+            if changes:
+                text.append("⚠️  SCORE CHANGES DETECTED!\n\n")
+            
+            for category, label in labels:
+                score = scores.get(category)
+                if score is None:
+                    continue
+                prev_score = previous.get(category, "N/A")
+                
+                diff = diffs.get(category)
+                if diff is not None:
+                    change = CHANGE_TEXT[(diff > 0) - (diff < 0) + 1].format(diff=diff)
                 else:
-                    change = "—"
-            else:
-                change = "First run"
+                    change = "First run"
+                
+                text.append(f"  {label:20} {score:3} (was {prev_score}) {change}\n")
             
-            text += f"  {category.replace('-', ' ').title():20} {score:3} (was {prev_score}) {change}\n"
+            text.append("\n")
         
-        text += "\n"
+        return "".join(text)
     
-    return text
+    return format_email_text
 
 
-def send_email(config: dict, subject: str, html_body: str, text_body: str) -> bool:
-    """Send email via SMTP."""
-    if not all([config["smtp_user"], config["smtp_password"], config["email_to"]]):
-        print("Email not configured, skipping notification")
-        return False
+class SMTPNotifier:
+    """Send emails over one SMTP connection, logged in once and reused for every message.
     
-    try:
+    Usage:
+        with SMTPNotifier(config) as notifier:
+            notifier.send(subject, html_body, text_body)
+    """
+    
+    def __init__(self, config: dict):
+        self.config = config
+        self.server: Optional[smtplib.SMTP] = None
+    
+    def __enter__(self) -> "SMTPNotifier":
+        self.connect()
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    def connect(self) -> None:
+        """Open the connection, upgrade it with STARTTLS and log in."""
+        self.server = smtplib.SMTP(self.config["smtp_host"], self.config["smtp_port"])
+        try:
+            self.server.starttls()
+            self.server.login(self.config["smtp_user"], self.config["smtp_password"])
+        except Exception:
+            self.server.close()
+            self.server = None
+            raise
+    
+    def close(self) -> None:
+        """Say QUIT and close the connection; does nothing if it was never opened."""
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except smtplib.SMTPServerDisconnected:
+            pass
+        finally:
+            self.server.close()
+            self.server = None
+    
+    def send(self, subject: str, html_body: str, text_body: str) -> None:
+        """Send one multipart (plain text + HTML) email over the open connection."""
         msg = MIMEMultipart("alternative")
         msg["Subject"] = subject
-        msg["From"] = config["email_from"] or config["smtp_user"]
-        msg["To"] = config["email_to"]
+        msg["From"] = self.config["email_from"] or self.config["smtp_user"]
+        msg["To"] = self.config["email_to"]
         
         msg.attach(MIMEText(text_body, "plain"))
         msg.attach(MIMEText(html_body, "html"))
         
-        with smtplib.SMTP(config["smtp_host"], config["smtp_port"]) as server:
-            server.starttls()
-            server.login(config["smtp_user"], config["smtp_password"])
-            server.sendmail(msg["From"], config["email_to"].split(","), msg.as_string())
-        
-        print(f"Email sent to {config['email_to']}")
+        self.server.sendmail(msg["From"], self.config["email_to"].split(","), msg.as_string())
+        print(f"Email sent to {self.config['email_to']}")
+
+
+def fingerprint_report(text_body: str, run_date: str) -> str:
+    """Hash a rendered report, ignoring its run date, using xxhash when available."""
+    data = text_body.replace(run_date, "", 1).encode()
+    if xxhash is not None:
+        return xxhash.xxh64(data).hexdigest()
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def email_configured(config: dict) -> bool:
+    """Whether SMTP credentials and a recipient are set."""
+    return all([config["smtp_user"], config["smtp_password"], config["email_to"]])
+
+
+def send_email(config: dict, subject: str, html_body: str, text_body: str) -> bool:
+    """Send email via SMTP."""
+    if not email_configured(config):
+        print("Email not configured, skipping notification")
+        return False
+    
+    try:
+        with SMTPNotifier(config) as notifier:
+            notifier.send(subject, html_body, text_body)
         return True
         
     except Exception as e:
@@ -301,81 +699,122 @@ def send_email(config: dict, subject: str, html_body: str, text_body: str) -> bo
         return False
 
 
-def main():
-    """Main execution flow."""
-    config = load_config()
-    
-    if not config["urls"]:
-        print("No URLs configured. Add URLs to config.json or set LIGHTHOUSE_URLS env var.")
-        sys.exit(1)
+async def send_report(config: dict, notifier: Optional[SMTPNotifier], smtp_login: Optional[asyncio.Task],
+                      subject: str, html_body: str, text_body: str) -> bool:
+    """Send the report over the connection logged in during the audits.
     
-    # Filter out empty strings from URLs
-    urls = [u.strip() for u in config["urls"] if u.strip()]
-    
-    if not urls:
-        print("No valid URLs found.")
-        sys.exit(1)
+    Falls back to send_email on a fresh connection if that login failed or the
+    server dropped the connection while it sat idle.
+    """
+    if notifier is None:
+        return send_email(config, subject, html_body, text_body)
     
-    history = load_history()
+    try:
+        await smtp_login
+        await asyncio.to_thread(notifier.send, subject, html_body, text_body)
+        return True
+    except Exception as e:
+        print(f"Early SMTP connection failed: {str(e) or type(e).__name__}; retrying on a new one")
+        return await asyncio.to_thread(send_email, config, subject, html_body, text_body)
+
+
+async def run_monitor(config: dict, urls: list[str]) -> None:
+    """Audit all URLs, record the run in history and email the report."""
+    migrate_history()
     run_date = datetime.now().isoformat()
     
     # Get previous run for comparison
-    previous_run = history["runs"][-1] if history["runs"] else None
-    previous_scores = {}
-    if previous_run:
-        for result in previous_run.get("results", []):
-            previous_scores[result["url"]] = result["scores"]
+    previous_run = load_last_run()
+    previous_scores = previous_run.get("results", {}) if previous_run else {}
     
     # Run audits
     current_results = []
     has_changes = False
     
-    for url in urls:
-        scores = run_lighthouse(url, config["api_key"], config["categories"])
+    # Connect and log in to SMTP in a worker thread while the audits run, so the
+    # handshake is already done by the time the report is ready to send
+    notifier = SMTPNotifier(config) if email_configured(config) else None
+    smtp_login = asyncio.create_task(asyncio.to_thread(notifier.connect)) if notifier else None
+    
+    try:
+        all_scores = await run_all(urls, config)
         
-        if scores:
-            prev = previous_scores.get(url, {})
-            changes = compare_scores(scores, prev, config["threshold"])
-            
-            if changes:
-                has_changes = True
-            
-            current_results.append({
-                "url": url,
-                "scores": scores,
-                "previous": prev,
-                "changes": changes
-            })
-            
-            print(f"  Scores: {scores}")
-            if changes:
-                for change in changes:
-                    print(f"  ⚠️  {change['category']}: {change['previous']} → {change['current']} ({change['direction']})")
+        for url, scores in zip(urls, all_scores):
+            if scores:
+                prev = previous_scores.get(url, {})
+                diffs = diff_scores(scores, prev)
+                changes = compare_scores(scores, prev, diffs, config["threshold"])
+                
+                if changes:
+                    has_changes = True
+                
+                current_results.append({
+                    "url": url,
+                    "scores": scores,
+                    "previous": prev,
+                    "diffs": diffs,
+                    "changes": changes
+                })
+                
+                print(f"  Scores: {scores}")
+                if changes:
+                    for change in changes:
+                        print(f"  ⚠️  {change['category']}: {change['previous']} → {change['current']} ({change['direction']})")
+        
+        # Fingerprint the report (minus its run date) so an identical one can be skipped next time.
+        # Only a delivered (or already delivered) report's fingerprint is recorded.
+        format_email_html = make_html_renderer(config["categories"])
+        format_email_text = make_text_renderer(config["categories"])
+        
+        text_body = format_email_text(current_results, run_date) if current_results else None
+        email_hash = fingerprint_report(text_body, run_date) if text_body else None
+        delivered_hash = None
+        
+        # Send email first, so the history entry can depend on whether it went out
+        if current_results:
+            if not has_changes and previous_run and previous_run.get("email_hash") == email_hash:
+                print("Report unchanged since last run, skipping email")
+                delivered_hash = email_hash
+            else:
+                if has_changes:
+                    subject = "🚨 Lighthouse Alert: Score Changes Detected"
+                else:
+                    subject = "✅ Lighthouse Report: No Significant Changes"
+                
+                html_body = format_email_html(current_results, run_date)
+                
+                if await send_report(config, notifier, smtp_login, subject, html_body, text_body):
+                    delivered_hash = email_hash
+    finally:
+        if notifier is not None:
+            await asyncio.gather(smtp_login, return_exceptions=True)
+            await asyncio.to_thread(notifier.close)
     
     # Save to history
-    history["runs"].append({
+    save_history({
         "date": run_date,
-        "results": [{"url": r["url"], "scores": r["scores"]} for r in current_results]
+        "results": {r["url"]: r["scores"] for r in current_results},
+        "email_hash": delivered_hash,
     })
+    print(f"\nResults saved to history.jsonl")
+
+
+def main():
+    """Main execution flow."""
+    config = load_config()
+    
+    if not config["urls"]:
+        print("No URLs configured. Add URLs to config.json or set LIGHTHOUSE_URLS env var.")
+        sys.exit(1)
     
-    # Keep only last 52 runs (1 year of weekly data)
-    if len(history["runs"]) > 52:
-        history["runs"] = history["runs"][-52:]
+    # Filter out empty strings from URLs
+    urls = [u.strip() for u in config["urls"] if u.strip()]
     
-    save_history(history)
-    print(f"\nResults saved to history.json")
+    if not urls:
+        print("No valid URLs found.")
+        sys.exit(1)
     
-    # Send email
-    if current_results:
-        if has_changes:
-            subject = "🚨 Lighthouse Alert: Score Changes Detected"
-        else:
-            subject = "✅ Lighthouse Report: No Significant Changes"
-        
-        html_body = format_email_html(current_results, run_date)
-        text_body = format_email_text(current_results, run_date)
-        
-        send_email(config, subject, html_body, text_body)
+    asyncio.run(run_monitor(config, urls))
 
 
 if __name__ == "__main__":